@@ -22,6 +22,24 @@ def load_config(config_path: str = "config/urls.json") -> dict:
         return json.load(f)
 
 
+def filter_products_by_threshold(products: list, max_ntd) -> list:
+    """只保留台幣價格在門檻內（0 < price_twd <= max_ntd）的商品，max_ntd 為 None 時不過濾"""
+    if max_ntd is None:
+        return products
+    return [p for p in products if 0 < p.get("price_twd", 0) <= max_ntd]
+
+
+def filter_price_dropped_by_threshold(price_dropped: list, max_ntd) -> list:
+    """同 filter_products_by_threshold，但作用於 compare_products 的降價項目"""
+    if max_ntd is None:
+        return price_dropped
+    return [
+        item
+        for item in price_dropped
+        if 0 < item["product"].get("price_twd", 0) <= max_ntd
+    ]
+
+
 def main():
     """主程式"""
     # 載入配置
@@ -78,22 +96,17 @@ def main():
             # 如果有設定 max_ntd，過濾符合門檻的商品
             if max_ntd is not None:
                 # 過濾新商品：只保留台幣價格 <= max_ntd 的商品
-                filtered_new_products = [
-                    p
-                    for p in new_products
-                    if p.get("price_twd", 0) > 0 and p.get("price_twd", 0) <= max_ntd
-                ]
+                filtered_new_products = filter_products_by_threshold(
+                    new_products, max_ntd
+                )
                 print(
                     f"New products (total: {len(new_products)}, within budget: {len(filtered_new_products)})"
                 )
 
                 # 過濾降價商品：只保留台幣價格 <= max_ntd 的商品
-                filtered_price_dropped = [
-                    item
-                    for item in price_dropped
-                    if item["product"].get("price_twd", 0) > 0
-                    and item["product"].get("price_twd", 0) <= max_ntd
-                ]
+                filtered_price_dropped = filter_price_dropped_by_threshold(
+                    price_dropped, max_ntd
+                )
                 print(
                     f"Price dropped (total: {len(price_dropped)}, within budget: {len(filtered_price_dropped)})"
                 )
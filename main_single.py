@@ -13,6 +13,7 @@ from src.scraper import MercariScraper
 from src.storage import ProductStorage
 from src.notifier import TelegramNotifier
 from src.telegram_commands import process_ignore_commands
+from main import filter_products_by_threshold, filter_price_dropped_by_threshold
 
 # 載入 .env 檔案
 load_dotenv()
@@ -82,22 +83,15 @@ def main():
         # 如果有設定 max_ntd，過濾符合門檻的商品
         if max_ntd is not None:
             # 過濾新商品：只保留台幣價格 <= max_ntd 的商品
-            filtered_new_products = [
-                p
-                for p in new_products
-                if p.get("price_twd", 0) > 0 and p.get("price_twd", 0) <= max_ntd
-            ]
+            filtered_new_products = filter_products_by_threshold(new_products, max_ntd)
             print(
                 f"New products (total: {len(new_products)}, within budget: {len(filtered_new_products)})"
             )
 
             # 過濾降價商品：只保留台幣價格 <= max_ntd 的商品
-            filtered_price_dropped = [
-                item
-                for item in price_dropped
-                if item["product"].get("price_twd", 0) > 0
-                and item["product"].get("price_twd", 0) <= max_ntd
-            ]
+            filtered_price_dropped = filter_price_dropped_by_threshold(
+                price_dropped, max_ntd
+            )
             print(
                 f"Price dropped (total: {len(price_dropped)}, within budget: {len(filtered_price_dropped)})"
             )
@@ -1,25 +1,42 @@
 import html
 import os
+import time
 import requests
 from urllib.parse import quote
 from typing import Dict, List, Optional
 
+# 被 Telegram 限流（HTTP 429）時最多等待的秒數
+MAX_RETRY_AFTER = 60
+
+# 通知訊息範本（新商品與降價共用，只在呼叫時代入變數）
+_MESSAGE_TEMPLATE = (
+    "<b>{header}</b>\n\n"
+    "<b>{title}</b>\n"
+    "{price_str}\n"
+    '<a href="{product_url}">查看商品</a>'
+)
+
 
 class TelegramNotifier:
     def __init__(self, bot_token: str = None, chat_id: str = None):
         self.bot_token = bot_token or os.getenv("TELEGRAM_BOT_TOKEN")
         self.chat_id = chat_id or os.getenv("TELEGRAM_CHAT_ID")
         self._bot_username: Optional[str] = None
+        self._bot_username_fetched = False
         if not self.bot_token or not self.chat_id:
             raise ValueError("TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID must be set")
+        # 共用連線（keep-alive），批次通知時不必每則訊息重新建立 TLS 連線
+        self.session = requests.Session()
 
     def _get_bot_username(self) -> Optional[str]:
-        """取得 bot username，用於建構 ignore 連結"""
-        if self._bot_username is not None:
+        """取得 bot username，用於建構 ignore 連結（每個實例只呼叫一次 getMe）"""
+        if self._bot_username_fetched:
             return self._bot_username
+        # 失敗也記住結果，避免批次通知時每則訊息都重試 getMe
+        self._bot_username_fetched = True
         try:
             url = f"https://api.telegram.org/bot{self.bot_token}/getMe"
-            response = requests.get(url, timeout=5)
+            response = self.session.get(url, timeout=5)
             response.raise_for_status()
             data = response.json()
             if data.get("ok"):
@@ -46,7 +63,14 @@ class TelegramNotifier:
             data = {"chat_id": self.chat_id, "text": text, "parse_mode": "HTML"}
 
         try:
-            response = requests.post(url, json=data, timeout=10)
+            response = self.session.post(url, json=data, timeout=10)
+            if response.status_code == 429:
+                # 被限流時依照 Telegram 回傳的 retry_after 等待後重送一次
+                retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+                wait_time = min(MAX_RETRY_AFTER, retry_after)
+                print(f"Telegram rate limited, retrying in {wait_time} seconds...")
+                time.sleep(wait_time)
+                response = self.session.post(url, json=data, timeout=10)
             response.raise_for_status()
             return True
         except Exception as e:
@@ -70,15 +94,7 @@ class TelegramNotifier:
         # 根據是否在預算內選擇不同的標題
         title = "有預算內目標商品上架" if is_within_budget else "新商品上架"
 
-        message = (
-            f"<b>{title}</b>\n\n"
-            f"<b>{product['title']}</b>\n"
-            f"{price_str}\n"
-            f'<a href="{product["product_url"]}">查看商品</a>'
-        )
-        ignore_link = self._build_ignore_link(product["id"])
-        if ignore_link:
-            message += f"\n{ignore_link}"
+        message = self._build_message(title, product, price_str)
         return self._send_message(message, product.get("image_url"))
 
     def notify_price_drop(
@@ -92,6 +108,15 @@ class TelegramNotifier:
         price_jpy = product.get("price_jpy", 0)
         price_twd = product.get("price_twd", 0)
 
+        # 日幣價格其實沒有降低時不通知（在組訊息之前就返回）
+        if (
+            old_price_jpy is not None
+            and old_price_jpy > 0
+            and price_jpy is not None
+            and price_jpy >= old_price_jpy
+        ):
+            return False
+
         # 判斷是否從超過預算降到預算內
         dropped_to_budget = False
         if max_ntd is not None and old_price_twd is not None:
@@ -136,16 +161,21 @@ class TelegramNotifier:
         else:
             title = "價格降低"
 
-        message = (
-            f"<b>{title}</b>\n\n"
-            f"<b>{product['title']}</b>\n"
-            f"{price_str}\n"
-            f'<a href="{product["product_url"]}">查看商品</a>'
+        message = self._build_message(title, product, price_str)
+        return self._send_message(message, product.get("image_url"))
+
+    def _build_message(self, header: str, product: Dict, price_str: str) -> str:
+        """以訊息範本組出通知內容，並附上 /ignore 連結（若可取得）"""
+        message = _MESSAGE_TEMPLATE.format(
+            header=header,
+            title=product["title"],
+            price_str=price_str,
+            product_url=product["product_url"],
         )
         ignore_link = self._build_ignore_link(product["id"])
         if ignore_link:
             message += f"\n{ignore_link}"
-        return self._send_message(message, product.get("image_url"))
+        return message
 
     def _build_ignore_link(self, product_id: str) -> Optional[str]:
         """建構可點擊的 /ignore 連結，點擊後預填指令"""
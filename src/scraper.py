@@ -3,15 +3,44 @@ import random
 import re
 import json
 from urllib.parse import urlparse, urlencode, parse_qs, urlunparse
-from typing import List, Dict, Optional, Tuple
-from playwright.sync_api import sync_playwright, Page, Browser
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 from src.exchange_rate import ExchangeRate
 
+if TYPE_CHECKING:
+    from playwright.sync_api import Page
+
+# 商品 URL 前綴：以 "m" 開頭的 ID 為 /item/，其餘為 /products/
+_URL_FMT = ("https://jp.mercari.com/products/", "https://jp.mercari.com/item/")
+
+# 預先編譯的正規表示式（_extract_product_id / _parse_price 每個商品都會呼叫）
+_PRODUCT_ID_RES = (
+    re.compile(r"/products/([a-zA-Z0-9]+)"),
+    re.compile(r"/item/([a-zA-Z0-9]+)"),
+    re.compile(r"/jp/([a-zA-Z0-9]+)"),
+)
+_JPY_RES = (
+    re.compile(r"([\d,]+)\s*日圓"),
+    re.compile(r"¥\s*([\d,]+)"),
+    re.compile(r"JPY\s*([\d,]+)"),
+)
+_TWD_RES = (
+    re.compile(r"NT\$\s*([\d,]+)"),
+    re.compile(r"TWD\s*([\d,]+)"),
+    re.compile(r"NT\s*([\d,]+)"),
+)
+_NUMBER_RE = re.compile(r"([\d,]+)")
+
 
 class MercariScraper:
-    def __init__(self, headless: bool = True, fetch_product_names: bool = True):
+    def __init__(
+        self,
+        headless: bool = True,
+        fetch_product_names: bool = True,
+        page_jitter: bool = False,
+    ):
         self.headless = headless
         self.fetch_product_names = fetch_product_names  # 是否訪問詳情頁獲取名稱
+        self.page_jitter = page_jitter  # 翻頁後是否額外隨機等待（模擬人類操作）
         self.user_agents = [
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15",
@@ -30,7 +59,7 @@ class MercariScraper:
         new_parsed = parsed._replace(query=new_query)
         return urlunparse(new_parsed)
 
-    def _fetch_product_name(self, page: Page, product_url: str) -> str:
+    def _fetch_product_name(self, page: "Page", product_url: str) -> str:
         """訪問商品詳情頁獲取商品名稱"""
         if not self.fetch_product_names:
             return ""
@@ -76,13 +105,8 @@ class MercariScraper:
         # - https://jp.mercari.com/products/m1234567890
         # - https://jp.mercari.com/item/m1234567890
         # - https://item.mercari.com/jp/m1234567890
-        patterns = [
-            r"/products/([a-zA-Z0-9]+)",
-            r"/item/([a-zA-Z0-9]+)",
-            r"/jp/([a-zA-Z0-9]+)",
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, product_url)
+        for pattern in _PRODUCT_ID_RES:
+            match = pattern.search(product_url)
             if match:
                 return match.group(1)
         return None
@@ -102,25 +126,15 @@ class MercariScraper:
         twd = 0
 
         # 提取日圓價格（多種格式）
-        jpy_patterns = [
-            r"([\d,]+)\s*日圓",
-            r"¥\s*([\d,]+)",
-            r"JPY\s*([\d,]+)",
-        ]
-        for pattern in jpy_patterns:
-            match = re.search(pattern, price_text)
+        for pattern in _JPY_RES:
+            match = pattern.search(price_text)
             if match:
                 jpy = int(match.group(1).replace(",", ""))
                 break
 
         # 提取台幣價格（多種格式）
-        twd_patterns = [
-            r"NT\$\s*([\d,]+)",
-            r"TWD\s*([\d,]+)",
-            r"NT\s*([\d,]+)",
-        ]
-        for pattern in twd_patterns:
-            match = re.search(pattern, price_text)
+        for pattern in _TWD_RES:
+            match = pattern.search(price_text)
             if match:
                 twd = int(match.group(1).replace(",", ""))
                 break
@@ -128,7 +142,7 @@ class MercariScraper:
         # 如果只找到一個數字且沒有貨幣標記，假設是台幣（Mercari 台灣站）
         if jpy == 0 and twd == 0:
             # 查找所有數字
-            numbers = re.findall(r"([\d,]+)", price_text)
+            numbers = _NUMBER_RE.findall(price_text)
             if numbers:
                 # 取最大的數字作為價格（通常是價格）
                 max_num = max(
@@ -144,7 +158,7 @@ class MercariScraper:
 
         return jpy, twd
 
-    def _extract_products_from_page(self, page: Page) -> List[Dict]:
+    def _extract_products_from_page(self, page: "Page") -> List[Dict]:
         """從當前頁面提取商品資訊"""
         products = []
         # 等待頁面載入
@@ -698,7 +712,7 @@ class MercariScraper:
 
         return products
 
-    def _has_next_page(self, page: Page) -> bool:
+    def _has_next_page(self, page: "Page") -> bool:
         """檢查是否有下一頁"""
         try:
             # 尋找「下一頁」連結
@@ -711,7 +725,7 @@ class MercariScraper:
             pass
         return False
 
-    def _go_to_next_page(self, page: Page) -> bool:
+    def _go_to_next_page(self, page: "Page") -> bool:
         """翻到下一頁"""
         try:
             next_link = page.locator("a:has-text('下一頁')").first
@@ -719,13 +733,50 @@ class MercariScraper:
                 next_link.click()
                 # 等待頁面載入（使用更寬鬆的條件）
                 page.wait_for_load_state("domcontentloaded", timeout=30000)
-                time.sleep(random.uniform(2, 4))  # 增加頁面間延遲
+                # 頁面載入已由 wait_for_load_state 等待，隨機延遲僅在需要時啟用
+                if self.page_jitter:
+                    time.sleep(random.uniform(2, 4))
                 return True
         except Exception as e:
             print(f"Error going to next page: {e}")
         return False
 
-    def _call_search_api(self, page: Page, keyword: str) -> List[Dict]:
+    @staticmethod
+    def _normalize_item(item: Dict) -> Optional[Dict]:
+        """將 API 響應中的單一 item 轉換為標準商品格式（台幣價格為 0）"""
+        product_id = item.get("id", "")
+        if not product_id:
+            return None
+
+        # 提取圖片
+        thumbnails = item.get("thumbnails", [])
+        photos = item.get("photos", [])
+        image_url = ""
+        if thumbnails:
+            image_url = thumbnails[0]
+        elif photos:
+            image_url = photos[0].get("uri", "")
+
+        return {
+            "id": product_id,
+            "title": item.get("name", ""),
+            "price_jpy": int(item.get("price", 0)),
+            "price_twd": 0,
+            "image_url": image_url,
+            # 構建商品 URL（根據 ID 格式）
+            "product_url": _URL_FMT[product_id[:1] == "m"] + product_id,
+        }
+
+    @classmethod
+    def _extract_products(cls, items: List[Dict]) -> List[Dict]:
+        """將 API 響應的 items 轉換為標準商品列表（略過沒有 ID 的 item）"""
+        return [
+            product
+            for product in map(cls._normalize_item, items)
+            if product is not None
+        ]
+
+    def _call_search_api(self, page: "Page", keyword: str) -> List[Dict]:
         """攔截瀏覽器發送的 API 請求來獲取商品"""
         products = []
         api_response_data = None
@@ -758,46 +809,8 @@ class MercariScraper:
                 print(f"攔截到 API 響應，返回 {len(items)} 個商品")
 
                 # 轉換 API 響應為標準格式
-                for item in items:
-                    product_id = item.get("id", "")
-                    if not product_id:
-                        continue
-
-                    # 提取價格（日圓）
-                    price_jpy = int(item.get("price", 0))
-
-                    # 提取商品名稱
-                    name = item.get("name", "")
-
-                    # 提取圖片
-                    thumbnails = item.get("thumbnails", [])
-                    photos = item.get("photos", [])
-                    image_url = ""
-                    if thumbnails:
-                        image_url = thumbnails[0]
-                    elif photos:
-                        image_url = photos[0].get("uri", "")
-
-                    # 構建商品 URL（根據 ID 格式）
-                    if product_id.startswith("m"):
-                        product_url = f"https://jp.mercari.com/item/{product_id}"
-                    else:
-                        product_url = f"https://jp.mercari.com/products/{product_id}"
-
-                    # 台幣價格需要從其他地方獲取或計算（API 只返回日圓）
-                    # 暫時設為 0，後續可以通過匯率轉換
-                    price_twd = 0
-
-                    products.append(
-                        {
-                            "id": product_id,
-                            "title": name,
-                            "price_jpy": price_jpy,
-                            "price_twd": price_twd,
-                            "image_url": image_url,
-                            "product_url": product_url,
-                        }
-                    )
+                # 台幣價格需要從其他地方獲取或計算（API 只返回日圓），暫時為 0
+                products = self._extract_products(items)
             else:
                 print("未能攔截到 API 響應")
 
@@ -811,6 +824,9 @@ class MercariScraper:
 
     def scrape(self, url: str, max_retries: int = 3) -> List[Dict]:
         """爬取指定 URL 的所有商品（支援多頁）"""
+        # 只有實際爬取時才載入 Playwright（解析相關方法不需要瀏覽器）
+        from playwright.sync_api import sync_playwright
+
         url_with_status = self._add_status_parameter(url)
         all_products = []
 
@@ -894,49 +910,14 @@ class MercariScraper:
                         print(f"從攔截的 API 響應中提取 {len(items)} 個商品")
 
                         # 轉換 API 響應為標準格式
-                        for item in items:
-                            product_id = item.get("id", "")
-                            if not product_id:
-                                continue
-
-                            # 提取價格（日圓）
-                            price_jpy = int(item.get("price", 0))
-
-                            # 提取商品名稱
-                            name = item.get("name", "")
-
-                            # 提取圖片
-                            thumbnails = item.get("thumbnails", [])
-                            photos = item.get("photos", [])
-                            image_url = ""
-                            if thumbnails:
-                                image_url = thumbnails[0]
-                            elif photos:
-                                image_url = photos[0].get("uri", "")
-
-                            # 構建商品 URL（根據 ID 格式）
-                            if product_id.startswith("m"):
-                                product_url = (
-                                    f"https://jp.mercari.com/item/{product_id}"
-                                )
-                            else:
-                                product_url = (
-                                    f"https://jp.mercari.com/products/{product_id}"
-                                )
-
+                        for product in self._extract_products(items):
                             # 使用匯率計算台幣價格
-                            price_twd = self.exchange_rate.convert_jpy_to_twd(price_jpy)
-
-                            all_products.append(
-                                {
-                                    "id": product_id,
-                                    "title": name,
-                                    "price_jpy": price_jpy,
-                                    "price_twd": price_twd,
-                                    "image_url": image_url,
-                                    "product_url": product_url,
-                                }
+                            product["price_twd"] = (
+                                self.exchange_rate.convert_jpy_to_twd(
+                                    product["price_jpy"]
+                                )
                             )
+                            all_products.append(product)
 
                     # 如果 API 方式失敗，回退到 DOM 方式
                     if not all_products:
@@ -975,7 +956,8 @@ class MercariScraper:
             except Exception as e:
                 print(f"Attempt {attempt + 1} failed: {e}")
                 if attempt < max_retries - 1:
-                    wait_time = random.uniform(5, 10) * (attempt + 1)
+                    # 指數退避（上限 30 秒）加少量抖動
+                    wait_time = min(30, 2**attempt + random.random())
                     print(f"Retrying in {wait_time:.1f} seconds...")
                     time.sleep(wait_time)
                 else:
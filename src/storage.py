@@ -1,3 +1,4 @@
+import json
 import sqlite3
 import os
 from datetime import datetime
@@ -7,13 +8,39 @@ from typing import List, Dict, Optional, Set
 class ProductStorage:
     def __init__(self, db_path: str = "data/products.db"):
         self.db_path = db_path
+        # ":memory:" 資料庫只存在於單一連線中，因此全程共用同一個連線
+        self._shared_conn: Optional[sqlite3.Connection] = None
+        if db_path == ":memory:":
+            self._shared_conn = sqlite3.connect(db_path)
         self._ensure_db_exists()
 
+    def _connect(self) -> sqlite3.Connection:
+        """取得資料庫連線（檔案資料庫每次開新連線）"""
+        if self._shared_conn is not None:
+            return self._shared_conn
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        # WAL 模式下 NORMAL 不會損毀資料庫，且 commit 時不必每次 fsync
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        """釋放 _connect() 取得的連線（共用連線不關閉）"""
+        if conn is not self._shared_conn:
+            conn.close()
+
+    def close(self) -> None:
+        """關閉共用連線（僅 ":memory:" 資料庫需要）"""
+        if self._shared_conn is not None:
+            self._shared_conn.close()
+            self._shared_conn = None
+
     def _ensure_db_exists(self):
         """確保資料庫檔案和資料表存在"""
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
         # 使用 WAL 模式以支援並發讀寫
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn = self._connect()
         conn.execute("PRAGMA journal_mode=WAL")  # 啟用 WAL 模式
         cursor = conn.cursor()
         cursor.execute("""
@@ -39,142 +66,107 @@ class ProductStorage:
             )
         """)
         conn.commit()
-        conn.close()
+        self._release(conn)
 
     def add_ignored(self, product_id: str) -> None:
         """將商品加入忽略清單"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             "INSERT OR IGNORE INTO ignored_products (product_id) VALUES (?)",
             (product_id,),
         )
         conn.commit()
-        conn.close()
+        self._release(conn)
 
     def get_ignored_ids(self) -> Set[str]:
         """取得忽略清單中的商品 ID"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute("SELECT product_id FROM ignored_products")
         ids = {row[0] for row in cursor.fetchall()}
-        conn.close()
+        self._release(conn)
         return ids
 
     def get_existing_products(self, product_ids: Set[str]) -> Dict[str, Dict]:
         """取得現有商品資料（只查詢當前搜尋結果中出現的商品）"""
         if not product_ids:
             return {}
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn = self._connect()
         cursor = conn.cursor()
-        placeholders = ",".join("?" * len(product_ids))
+        cursor.row_factory = sqlite3.Row
+        # ID 以 JSON 陣列傳入，SQL 字串固定不變，可重用 sqlite3 的 statement 快取
         cursor.execute(
-            f"SELECT * FROM products WHERE id IN ({placeholders})", list(product_ids)
+            "SELECT * FROM products WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(product_ids)),),
         )
-        columns = [desc[0] for desc in cursor.description]
-        products = {}
-        for row in cursor.fetchall():
-            product = dict(zip(columns, row))
-            products[product["id"]] = product
-        conn.close()
+        # 直接迭代 cursor，避免 fetchall() 先建立完整列表
+        products = {row["id"]: dict(row) for row in cursor}
+        self._release(conn)
         return products
 
     def upsert_product(self, product: Dict):
         """新增或更新商品（只保留最新狀態）"""
-        now = datetime.now().isoformat()
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        cursor = conn.cursor()
+        self.upsert_products([product])
 
-        # 檢查商品是否已存在
-        cursor.execute(
-            "SELECT id, lowest_price_jpy, lowest_price_twd FROM products WHERE id = ?",
-            (product["id"],),
-        )
-        existing = cursor.fetchone()
-
-        if existing:
-            # 更新現有商品
-            existing_id, existing_lowest_jpy, existing_lowest_twd = existing
-
-            # 更新最低價格（只更新有實際價格的部分，避免 0 或 1 的誤判）
-            new_price_jpy = product["price_jpy"]
-            new_price_twd = product["price_twd"]
-
-            # 如果舊的最低價是 0 或 1（可能是初始值或錯誤值），直接使用新價格
-            if existing_lowest_jpy is None or existing_lowest_jpy <= 1:
-                lowest_price_jpy = new_price_jpy if new_price_jpy > 0 else None
-            else:
-                # 只比較有實際價格的情況
-                if new_price_jpy > 0:
-                    lowest_price_jpy = min(existing_lowest_jpy, new_price_jpy)
-                else:
-                    lowest_price_jpy = existing_lowest_jpy
-
-            if existing_lowest_twd is None or existing_lowest_twd <= 1:
-                lowest_price_twd = new_price_twd if new_price_twd > 0 else None
-            else:
-                if new_price_twd > 0:
-                    lowest_price_twd = min(existing_lowest_twd, new_price_twd)
-                else:
-                    lowest_price_twd = existing_lowest_twd
-
-            cursor.execute(
-                """
-                UPDATE products SET
-                    title = ?,
-                    price_jpy = ?,
-                    price_twd = ?,
-                    image_url = ?,
-                    product_url = ?,
-                    last_updated = ?,
-                    lowest_price_jpy = ?,
-                    lowest_price_twd = ?
-                WHERE id = ?
-            """,
-                (
-                    product["title"],
-                    product["price_jpy"],
-                    product["price_twd"],
-                    product["image_url"],
-                    product["product_url"],
-                    now,
-                    lowest_price_jpy,
-                    lowest_price_twd,
-                    product["id"],
-                ),
-            )
-        else:
-            # 新增商品
-            lowest_price_jpy = (
-                product["price_jpy"] if product["price_jpy"] > 0 else None
-            )
-            lowest_price_twd = (
-                product["price_twd"] if product["price_twd"] > 0 else None
-            )
-
-            cursor.execute(
-                """
-                INSERT INTO products (
-                    id, title, price_jpy, price_twd, image_url, product_url,
-                    first_seen, last_updated, lowest_price_jpy, lowest_price_twd
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    product["id"],
-                    product["title"],
-                    product["price_jpy"],
-                    product["price_twd"],
-                    product["image_url"],
-                    product["product_url"],
-                    now,
-                    now,
-                    lowest_price_jpy,
-                    lowest_price_twd,
-                ),
+    def upsert_products(self, products: List[Dict]):
+        """批次新增或更新商品（以 executemany 在單一交易內完成）"""
+        if not products:
+            return
+        now = datetime.now().isoformat()
+        rows = [
+            (
+                product["id"],
+                product["title"],
+                product["price_jpy"],
+                product["price_twd"],
+                product["image_url"],
+                product["product_url"],
+                now,
+                now,
+                product["price_jpy"] if product["price_jpy"] > 0 else None,
+                product["price_twd"] if product["price_twd"] > 0 else None,
             )
-
+            for product in products
+        ]
+        conn = self._connect()
+        # 已存在的商品保留 first_seen，最低價格規則：
+        # - 舊的最低價是 NULL、0 或 1（初始值或錯誤值）時，直接使用新價格
+        # - 否則只在新價格 > 0 時取較小者（避免 0 或 1 的誤判）
+        conn.executemany(
+            """
+            INSERT INTO products (
+                id, title, price_jpy, price_twd, image_url, product_url,
+                first_seen, last_updated, lowest_price_jpy, lowest_price_twd
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                title = excluded.title,
+                price_jpy = excluded.price_jpy,
+                price_twd = excluded.price_twd,
+                image_url = excluded.image_url,
+                product_url = excluded.product_url,
+                last_updated = excluded.last_updated,
+                lowest_price_jpy = CASE
+                    WHEN products.lowest_price_jpy IS NULL
+                        OR products.lowest_price_jpy <= 1
+                        THEN excluded.lowest_price_jpy
+                    WHEN excluded.price_jpy > 0
+                        THEN MIN(products.lowest_price_jpy, excluded.price_jpy)
+                    ELSE products.lowest_price_jpy
+                END,
+                lowest_price_twd = CASE
+                    WHEN products.lowest_price_twd IS NULL
+                        OR products.lowest_price_twd <= 1
+                        THEN excluded.lowest_price_twd
+                    WHEN excluded.price_twd > 0
+                        THEN MIN(products.lowest_price_twd, excluded.price_twd)
+                    ELSE products.lowest_price_twd
+                END
+        """,
+            rows,
+        )
         conn.commit()
-        conn.close()
+        self._release(conn)
 
     def compare_products(self, current_products: List[Dict]) -> Dict[str, List[Dict]]:
         """
@@ -188,6 +180,8 @@ class ProductStorage:
 
         new_products = []
         price_dropped_products = []
+        # 收集需要寫入的商品，最後在單一交易內一次寫入
+        to_upsert = []
 
         for product in current_products:
             product_id = product["id"]
@@ -196,7 +190,7 @@ class ProductStorage:
             if product_id not in existing_products:
                 # 新商品
                 new_products.append(product)
-                self.upsert_product(product)
+                to_upsert.append(product)
             else:
                 # 已存在的商品，檢查價格是否降低
                 existing = existing_products[product_id]
@@ -227,6 +221,7 @@ class ProductStorage:
                             "old_price_twd": old_price_twd,
                         }
                     )
-                self.upsert_product(product)
+                to_upsert.append(product)
 
+        self.upsert_products(to_upsert)
         return {"new": new_products, "price_dropped": price_dropped_products}
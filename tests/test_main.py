@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+測試 main 模組的台幣價格門檻過濾
+"""
+
+import unittest
+
+from main import filter_products_by_threshold, filter_price_dropped_by_threshold
+
+
+def _product(product_id, price_twd):
+    return {"id": product_id, "title": "測試商品", "price_twd": price_twd}
+
+
+class TestFilterProductsByThreshold(unittest.TestCase):
+    def test_no_threshold_returns_all(self):
+        """max_ntd 為 None 時不過濾"""
+        products = [_product("a", 0), _product("b", 9999)]
+        self.assertIs(filter_products_by_threshold(products, None), products)
+
+    def test_filters_by_threshold(self):
+        """只保留 0 < price_twd <= max_ntd 的商品（含邊界值）"""
+        products = [
+            _product("zero", 0),
+            _product("within", 300),
+            _product("boundary", 500),
+            _product("over", 501),
+            {"id": "missing", "title": "沒有台幣價格"},
+        ]
+        filtered = filter_products_by_threshold(products, 500)
+        self.assertEqual([p["id"] for p in filtered], ["within", "boundary"])
+
+    def test_filters_price_dropped_items(self):
+        """降價項目以 item["product"] 的台幣價格過濾，並保留原本的項目結構"""
+        within = {"product": _product("within", 400), "old_price_jpy": 1000}
+        over = {"product": _product("over", 600), "old_price_jpy": 1000}
+        self.assertEqual(
+            filter_price_dropped_by_threshold([within, over], 500), [within]
+        )
+        self.assertEqual(
+            filter_price_dropped_by_threshold([within, over], None), [within, over]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
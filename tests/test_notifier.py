@@ -5,26 +5,69 @@
 
 import unittest
 import os
-from unittest.mock import patch, MagicMock
+from types import SimpleNamespace
+from unittest.mock import patch
 from src.notifier import TelegramNotifier
 
+_GETME_OK = {"ok": True, "result": {"username": "test_bot"}}
+_BASE_PRODUCT = {
+    "id": "test123",
+    "title": "測試商品",
+    "price_jpy": 1000,
+    "price_twd": 200,
+    "image_url": "https://example.com/image.jpg",
+    "product_url": "https://example.com/product",
+}
+
+
+def _ok_response(json=None):
+    """建立成功（200）的輕量 HTTP 回應替身，比 MagicMock 便宜許多"""
+    return SimpleNamespace(
+        status_code=200,
+        raise_for_status=lambda: None,
+        json=lambda: json or {},
+    )
+
 
 class TestTelegramNotifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """整個測試類別只安裝一次 Telegram API 的 mock（一律回應成功）"""
+        cls.session_patcher = patch("src.notifier.requests.Session")
+        mock_session = cls.session_patcher.start().return_value
+        cls.mock_get = mock_session.get
+        cls.mock_post = mock_session.post
+
+        cls.mock_get.return_value = _ok_response(_GETME_OK)
+        cls.mock_post.return_value = _ok_response()
+
+        # 設置環境變數（結束後還原原值）並共用同一個 notifier（各測試不會修改其狀態）
+        cls.env_patcher = patch.dict(
+            os.environ,
+            {"TELEGRAM_BOT_TOKEN": "test_token", "TELEGRAM_CHAT_ID": "test_chat_id"},
+        )
+        cls.env_patcher.start()
+        cls.notifier = TelegramNotifier()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env_patcher.stop()
+        cls.session_patcher.stop()
+
     def setUp(self):
-        """每個測試前設置環境變數"""
-        os.environ["TELEGRAM_BOT_TOKEN"] = "test_token"
-        os.environ["TELEGRAM_CHAT_ID"] = "test_chat_id"
+        """每個測試前清除 mock 的呼叫紀錄與 side_effect"""
+        self.mock_get.reset_mock(side_effect=True)
+        self.mock_post.reset_mock(side_effect=True)
 
-    def tearDown(self):
-        """每個測試後清理環境變數"""
-        os.environ.pop("TELEGRAM_BOT_TOKEN", None)
-        os.environ.pop("TELEGRAM_CHAT_ID", None)
+    def _message_text(self) -> str:
+        """取得最後一次送出的訊息內容（有圖片時為 caption，沒有圖片時為 text）"""
+        call_data = self.mock_post.call_args[1]["json"]
+        return call_data.get("caption") or call_data.get("text", "")
 
     def test_init(self):
         """測試初始化"""
-        notifier = TelegramNotifier()
-        self.assertEqual(notifier.bot_token, "test_token")
-        self.assertEqual(notifier.chat_id, "test_chat_id")
+        self.assertEqual(self.notifier.bot_token, "test_token")
+        self.assertEqual(self.notifier.chat_id, "test_chat_id")
 
     def test_init_with_parameters(self):
         """測試使用參數初始化"""
@@ -32,274 +75,159 @@ class TestTelegramNotifier(unittest.TestCase):
         self.assertEqual(notifier.bot_token, "custom_token")
         self.assertEqual(notifier.chat_id, "custom_chat")
 
-    @patch("src.notifier.requests.get")
-    @patch("src.notifier.requests.post")
-    def test_notify_new_product(self, mock_post, mock_get):
-        """測試通知新商品"""
-        mock_get.return_value.json.return_value = {
-            "ok": True,
-            "result": {"username": "test_bot"},
-        }
-        mock_get.return_value.raise_for_status = MagicMock()
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.raise_for_status = MagicMock()
-        mock_post.return_value = mock_response
+    def test_notify_new_product(self):
+        """測試通知新商品（訊息包含 /ignore 連結）"""
+        product = {**_BASE_PRODUCT, "id": "m12345678"}
 
+        result = self.notifier.notify_new_product(product)
+        self.assertTrue(result)
+        self.mock_post.assert_called_once()
+
+        expected_ignore = f"/ignore {product['id']}"
+        expected_bot = "t.me/test_bot"
+        message_text = self._message_text()
+        self.assertIn(expected_ignore, message_text)
+        self.assertIn(expected_bot, message_text)
+
+    def test_notify_price_drop(self):
+        """測試通知價格降低的各種情境（訊息標題正確且包含 /ignore 連結）"""
+        expected_bot = "t.me/test_bot"
+        # (情境, 新價格, 原台幣價格, 預算, 應出現的標題, 不應出現的標題)
+        cases = [
+            ("plain", {"price_twd": 160}, None, None, "價格降低", "降價至預算範圍"),
+            # 原本 600 TWD（超過預算 500），現在降到 400 TWD（在預算內）
+            ("to_budget", {"price_twd": 400}, 600, 500, "降價至預算範圍", None),
+            # 原本 400 TWD（也在預算內），現在降到 300 TWD
+            (
+                "within_budget",
+                {"price_twd": 300},
+                400,
+                500,
+                "價格降低",
+                "降價至預算範圍",
+            ),
+        ]
+        for case_id, prices, old_price_twd, max_ntd, expected, forbidden in cases:
+            with self.subTest(case_id):
+                self.mock_post.reset_mock()
+                product = {
+                    **_BASE_PRODUCT,
+                    "id": "m87654321",
+                    "price_jpy": 800,  # 新價格
+                    **prices,
+                }
+
+                result = self.notifier.notify_price_drop(
+                    product,
+                    old_price_jpy=1000,
+                    old_price_twd=old_price_twd,
+                    max_ntd=max_ntd,
+                )
+                self.assertTrue(result)
+                self.mock_post.assert_called_once()
+
+                message_text = self._message_text()
+                self.assertIn(expected, message_text)
+                if forbidden:
+                    self.assertNotIn(forbidden, message_text)
+                self.assertIn(f"/ignore {product['id']}", message_text)
+                self.assertIn(expected_bot, message_text)
+
+    def test_notify_price_drop_noop_when_not_drop(self):
+        """測試日幣價格沒有降低時不送出通知"""
+        for price_jpy in (1000, 1200):
+            with self.subTest(price_jpy=price_jpy):
+                product = {**_BASE_PRODUCT, "price_jpy": price_jpy}
+                self.assertFalse(
+                    self.notifier.notify_price_drop(product, old_price_jpy=1000)
+                )
+                self.mock_post.assert_not_called()
+
+    def test_bot_username_fetched_once(self):
+        """測試 getMe 只呼叫一次，之後的通知沿用快取的 username"""
         notifier = TelegramNotifier()
-        product = {
-            "id": "test123",
-            "title": "測試商品",
-            "price_jpy": 1000,
-            "price_twd": 200,
-            "image_url": "https://example.com/image.jpg",
-            "product_url": "https://example.com/product",
-        }
+        product = {**_BASE_PRODUCT, "id": "m12345678"}
 
-        result = notifier.notify_new_product(product)
-        self.assertTrue(result)
-        mock_post.assert_called_once()
-
-    @patch("src.notifier.requests.get")
-    @patch("src.notifier.requests.post")
-    def test_notify_price_drop(self, mock_post, mock_get):
-        """測試通知價格降低"""
-        mock_get.return_value.json.return_value = {
-            "ok": True,
-            "result": {"username": "test_bot"},
-        }
-        mock_get.return_value.raise_for_status = MagicMock()
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.raise_for_status = MagicMock()
-        mock_post.return_value = mock_response
+        notifier.notify_new_product(product)
+        notifier.notify_new_product(product)
+        self.mock_get.assert_called_once()
+        self.assertIn("t.me/test_bot", self._message_text())
 
+    def test_bot_username_failure_not_retried(self):
+        """測試 getMe 失敗時不會每則訊息重試，訊息改為不含 /ignore 連結"""
         notifier = TelegramNotifier()
-        product = {
-            "id": "test123",
-            "title": "測試商品",
-            "price_jpy": 800,  # 新價格
-            "price_twd": 160,
-            "image_url": "https://example.com/image.jpg",
-            "product_url": "https://example.com/product",
-        }
+        product = {**_BASE_PRODUCT, "id": "m12345678"}
+
+        self.mock_get.side_effect = Exception("network down")
+        self.assertTrue(notifier.notify_new_product(product))
+        self.assertTrue(notifier.notify_new_product(product))
+        self.mock_get.assert_called_once()
+        self.assertNotIn("/ignore", self._message_text())
+
+    def test_send_message_retries_after_rate_limit(self):
+        """測試被限流（429）時依 retry_after 等待後重送"""
+        rate_limited = SimpleNamespace(
+            status_code=429,
+            json=lambda: {"ok": False, "parameters": {"retry_after": 3}},
+        )
+        self.mock_post.side_effect = [rate_limited, _ok_response()]
 
-        result = notifier.notify_price_drop(product, old_price_jpy=1000)
-        self.assertTrue(result)
-        mock_post.assert_called_once()
+        with patch("src.notifier.time.sleep") as mock_sleep:
+            self.assertTrue(self.notifier._send_message("hello"))
 
-        # 檢查訊息內容包含降價資訊
-        call_args = mock_post.call_args
-        self.assertIn("價格降低", str(call_args))
+        mock_sleep.assert_called_once_with(3)
+        self.assertEqual(self.mock_post.call_count, 2)
 
-    @patch("src.notifier.requests.get")
-    @patch("src.notifier.requests.post")
-    def test_notify_batch(self, mock_post, mock_get):
+    def test_notify_batch(self):
         """測試批次通知"""
-        mock_get.return_value.json.return_value = {
-            "ok": True,
-            "result": {"username": "test_bot"},
-        }
-        mock_get.return_value.raise_for_status = MagicMock()
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.raise_for_status = MagicMock()
-        mock_post.return_value = mock_response
-
-        notifier = TelegramNotifier()
         new_products = [
             {
+                **_BASE_PRODUCT,
                 "id": "new1",
                 "title": "新商品1",
-                "price_jpy": 1000,
-                "price_twd": 200,
-                "image_url": "https://example.com/image.jpg",
                 "product_url": "https://example.com/product1",
             }
         ]
         price_dropped = [
             {
-                "product": {
-                    "id": "test123",
-                    "title": "測試商品",
-                    "price_jpy": 800,
-                    "price_twd": 160,
-                    "image_url": "https://example.com/image.jpg",
-                    "product_url": "https://example.com/product",
-                },
+                "product": {**_BASE_PRODUCT, "price_jpy": 800, "price_twd": 160},
                 "old_price_jpy": 1000,
             }
         ]
 
-        success, total = notifier.notify_batch(new_products, price_dropped)
+        success, total = self.notifier.notify_batch(new_products, price_dropped)
         self.assertEqual(success, 2)
         self.assertEqual(total, 2)
-        self.assertEqual(mock_post.call_count, 2)
-
-    @patch("src.notifier.requests.get")
-    @patch("src.notifier.requests.post")
-    def test_notify_new_product_within_budget(self, mock_post, mock_get):
-        """測試通知預算內新商品上架"""
-        mock_get.return_value.json.return_value = {
-            "ok": True,
-            "result": {"username": "test_bot"},
+        self.assertEqual(self.mock_post.call_count, 2)
+
+    def test_notify_new_product_price_formatting(self):
+        """測試新商品通知的價格格式"""
+        base_product = {
+            k: v
+            for k, v in _BASE_PRODUCT.items()
+            if k not in ("price_jpy", "price_twd")
         }
-        mock_get.return_value.raise_for_status = MagicMock()
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.raise_for_status = MagicMock()
-        mock_post.return_value = mock_response
+        cases = [
+            ("normal", {"price_jpy": 1000, "price_twd": 200}, "日幣：¥1,000\n台幣：NT$200"),
+            ("zero", {"price_jpy": 0, "price_twd": 0}, "價格未標示"),
+            ("missing", {}, "價格未標示"),
+            ("large", {"price_jpy": 1234567, "price_twd": 0}, "日幣：¥1,234,567"),
+        ]
+        for case_id, prices, expected in cases:
+            with self.subTest(case_id):
+                self.notifier.notify_new_product({**base_product, **prices})
+                self.assertIn(f"\n{expected}\n", self._message_text())
 
-        notifier = TelegramNotifier()
-        product = {
-            "id": "test123",
-            "title": "測試商品",
-            "price_jpy": 1000,
-            "price_twd": 200,
-            "image_url": "https://example.com/image.jpg",
-            "product_url": "https://example.com/product",
-        }
+    def test_notify_new_product_within_budget(self):
+        """測試通知預算內新商品上架"""
+        product = dict(_BASE_PRODUCT)
 
-        result = notifier.notify_new_product(product, is_within_budget=True)
+        result = self.notifier.notify_new_product(product, is_within_budget=True)
         self.assertTrue(result)
-        mock_post.assert_called_once()
+        self.mock_post.assert_called_once()
 
         # 檢查訊息內容包含「有預算內目標商品上架」
-        # 有圖片時使用 caption，沒有圖片時使用 text
-        call_data = mock_post.call_args[1]["json"]
-        message_text = call_data.get("caption") or call_data.get("text", "")
-        self.assertIn("有預算內目標商品上架", message_text)
-
-    @patch("src.notifier.requests.get")
-    @patch("src.notifier.requests.post")
-    def test_notify_price_drop_to_budget(self, mock_post, mock_get):
-        """測試通知降價至預算範圍"""
-        mock_get.return_value.json.return_value = {
-            "ok": True,
-            "result": {"username": "test_bot"},
-        }
-        mock_get.return_value.raise_for_status = MagicMock()
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.raise_for_status = MagicMock()
-        mock_post.return_value = mock_response
-
-        notifier = TelegramNotifier()
-        product = {
-            "id": "test123",
-            "title": "測試商品",
-            "price_jpy": 800,  # 新價格
-            "price_twd": 400,  # 新價格在預算內（max_ntd=500）
-            "image_url": "https://example.com/image.jpg",
-            "product_url": "https://example.com/product",
-        }
-
-        # 原本價格 600 TWD（超過預算 500），現在降到 400 TWD（在預算內）
-        result = notifier.notify_price_drop(
-            product, old_price_jpy=1000, old_price_twd=600, max_ntd=500
-        )
-        self.assertTrue(result)
-        mock_post.assert_called_once()
-
-        # 檢查訊息內容包含「降價至預算範圍」
-        # 有圖片時使用 caption，沒有圖片時使用 text
-        call_data = mock_post.call_args[1]["json"]
-        message_text = call_data.get("caption") or call_data.get("text", "")
-        self.assertIn("降價至預算範圍", message_text)
-
-    @patch("src.notifier.requests.get")
-    @patch("src.notifier.requests.post")
-    def test_notify_price_drop_within_budget(self, mock_post, mock_get):
-        """測試通知預算內商品降價（保持原樣）"""
-        mock_get.return_value.json.return_value = {
-            "ok": True,
-            "result": {"username": "test_bot"},
-        }
-        mock_get.return_value.raise_for_status = MagicMock()
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.raise_for_status = MagicMock()
-        mock_post.return_value = mock_response
-
-        notifier = TelegramNotifier()
-        product = {
-            "id": "test123",
-            "title": "測試商品",
-            "price_jpy": 800,  # 新價格
-            "price_twd": 300,  # 新價格在預算內
-            "image_url": "https://example.com/image.jpg",
-            "product_url": "https://example.com/product",
-        }
-
-        # 原本價格 400 TWD（也在預算內），現在降到 300 TWD
-        result = notifier.notify_price_drop(
-            product, old_price_jpy=1000, old_price_twd=400, max_ntd=500
-        )
-        self.assertTrue(result)
-        mock_post.assert_called_once()
-
-        # 檢查訊息內容包含「價格降低」（不是「降價至預算範圍」）
-        # 有圖片時使用 caption，沒有圖片時使用 text
-        call_data = mock_post.call_args[1]["json"]
-        message_text = call_data.get("caption") or call_data.get("text", "")
-        self.assertIn("價格降低", message_text)
-        self.assertNotIn("降價至預算範圍", message_text)
-
-    @patch("src.notifier.requests.get")
-    @patch("src.notifier.requests.post")
-    def test_notify_new_product_includes_ignore_link(self, mock_post, mock_get):
-        """測試通知訊息包含 /ignore 連結"""
-        mock_get.return_value.json.return_value = {
-            "ok": True,
-            "result": {"username": "test_bot"},
-        }
-        mock_get.return_value.raise_for_status = MagicMock()
-        mock_post.return_value.status_code = 200
-        mock_post.return_value.raise_for_status = MagicMock()
-
-        notifier = TelegramNotifier()
-        product = {
-            "id": "m12345678",
-            "title": "測試商品",
-            "price_jpy": 1000,
-            "price_twd": 200,
-            "image_url": "https://example.com/image.jpg",
-            "product_url": "https://example.com/product",
-        }
-
-        notifier.notify_new_product(product)
-        call_data = mock_post.call_args[1]["json"]
-        message_text = call_data.get("caption") or call_data.get("text", "")
-        self.assertIn("/ignore m12345678", message_text)
-        self.assertIn("t.me/test_bot", message_text)
-
-    @patch("src.notifier.requests.get")
-    @patch("src.notifier.requests.post")
-    def test_notify_price_drop_includes_ignore_link(self, mock_post, mock_get):
-        """測試降價通知訊息包含 /ignore 連結"""
-        mock_get.return_value.json.return_value = {
-            "ok": True,
-            "result": {"username": "test_bot"},
-        }
-        mock_get.return_value.raise_for_status = MagicMock()
-        mock_post.return_value.status_code = 200
-        mock_post.return_value.raise_for_status = MagicMock()
-
-        notifier = TelegramNotifier()
-        product = {
-            "id": "m87654321",
-            "title": "測試商品",
-            "price_jpy": 800,
-            "price_twd": 160,
-            "image_url": "https://example.com/image.jpg",
-            "product_url": "https://example.com/product",
-        }
-
-        notifier.notify_price_drop(product, old_price_jpy=1000)
-        call_data = mock_post.call_args[1]["json"]
-        message_text = call_data.get("caption") or call_data.get("text", "")
-        self.assertIn("/ignore m87654321", message_text)
-        self.assertIn("t.me/test_bot", message_text)
+        self.assertIn("有預算內目標商品上架", self._message_text())
 
 
 if __name__ == "__main__":
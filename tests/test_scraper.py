@@ -6,18 +6,23 @@
 import unittest
 import json
 import os
+from types import MappingProxyType
 from unittest.mock import patch, MagicMock
 from src.scraper import MercariScraper
 
 
 class TestMercariScraper(unittest.TestCase):
-    def setUp(self):
-        """每個測試前載入測試資料"""
-        self.fixture_path = os.path.join(
+    @classmethod
+    def setUpClass(cls):
+        """載入測試資料（整個測試類別只讀取一次，以唯讀 mapping 共用）"""
+        cls.fixture_path = os.path.join(
             os.path.dirname(__file__), "fixtures", "api_response.json"
         )
-        with open(self.fixture_path, "r", encoding="utf-8") as f:
-            self.api_response_data = json.load(f)
+        with open(cls.fixture_path, "r", encoding="utf-8") as f:
+            cls.api_response_data = json.load(f, object_hook=MappingProxyType)
+        # 商品列表與提取結果也只計算一次，各測試共用
+        cls.items = cls.api_response_data.get("items", [])
+        cls.products = MercariScraper._extract_products(cls.items)
 
     def test_parse_api_response_structure(self):
         """測試解析 API 響應結構"""
@@ -31,81 +36,32 @@ class TestMercariScraper(unittest.TestCase):
         self.assertGreater(len(items), 0)
 
     def test_extract_product_from_api_item(self):
-        """測試從 API item 提取商品資訊（模擬 scraper 的邏輯）"""
-        items = self.api_response_data.get("items", [])
-        self.assertGreater(len(items), 0)
-
-        item = items[0]
-
-        # 模擬 scraper.py 中的提取邏輯
-        product_id = item.get("id", "")
-        price_jpy = int(item.get("price", 0))
-        name = item.get("name", "")
-        thumbnails = item.get("thumbnails", [])
-        photos = item.get("photos", [])
+        """測試從 API item 提取商品資訊"""
+        self.assertGreater(len(self.items), 0)
 
-        # 提取圖片 URL
-        image_url = ""
-        if thumbnails:
-            image_url = thumbnails[0]
-        elif photos:
-            image_url = photos[0].get("uri", "")
-
-        # 構建商品 URL
-        if product_id.startswith("m"):
-            product_url = f"https://jp.mercari.com/item/{product_id}"
-        else:
-            product_url = f"https://jp.mercari.com/products/{product_id}"
+        item = self.items[0]
+        product = MercariScraper._normalize_item(item)
 
         # 驗證提取的資料
-        self.assertNotEqual(product_id, "")
-        self.assertGreater(price_jpy, 0)
-        self.assertNotEqual(name, "")
-        self.assertNotEqual(image_url, "")
-        self.assertIn("mercari.com", product_url)
+        self.assertEqual(product["id"], item["id"])
+        self.assertGreater(product["price_jpy"], 0)
+        self.assertNotEqual(product["title"], "")
+        self.assertNotEqual(product["image_url"], "")
+        self.assertEqual(product["price_twd"], 0)
+        # 商品 URL 依 ID 格式選擇路徑（m 開頭為 /item/，其餘為 /products/）
+        prefix = "item" if item["id"][:1] == "m" else "products"
+        self.assertEqual(
+            product["product_url"], f"https://jp.mercari.com/{prefix}/{item['id']}"
+        )
 
     def test_extract_all_products_from_api_response(self):
         """測試從完整 API 響應提取所有商品"""
-        items = self.api_response_data.get("items", [])
-        products = []
-
-        for item in items:
-            product_id = item.get("id", "")
-            if not product_id:
-                continue
-
-            price_jpy = int(item.get("price", 0))
-            name = item.get("name", "")
-            thumbnails = item.get("thumbnails", [])
-            photos = item.get("photos", [])
-
-            image_url = ""
-            if thumbnails:
-                image_url = thumbnails[0]
-            elif photos:
-                image_url = photos[0].get("uri", "")
-
-            if product_id.startswith("m"):
-                product_url = f"https://jp.mercari.com/item/{product_id}"
-            else:
-                product_url = f"https://jp.mercari.com/products/{product_id}"
-
-            products.append(
-                {
-                    "id": product_id,
-                    "title": name,
-                    "price_jpy": price_jpy,
-                    "image_url": image_url,
-                    "product_url": product_url,
-                }
-            )
-
         # 驗證所有商品都被正確提取
-        self.assertGreater(len(products), 0)
-        self.assertEqual(len(products), len(items))
+        self.assertGreater(len(self.products), 0)
+        self.assertEqual(len(self.products), len(self.items))
 
         # 驗證每個商品都有必要欄位
-        for product in products:
+        for product in self.products:
             self.assertIn("id", product)
             self.assertIn("title", product)
             self.assertIn("price_jpy", product)
@@ -120,7 +76,7 @@ class TestMercariScraper(unittest.TestCase):
 
         # numFound 可能是字串或數字
         num_found_int = int(num_found)
-        items_count = len(self.api_response_data.get("items", []))
+        items_count = len(self.items)
 
         # 驗證商品數量
         self.assertGreater(num_found_int, 0)
@@ -128,10 +84,9 @@ class TestMercariScraper(unittest.TestCase):
 
     def test_product_id_format(self):
         """測試商品 ID 格式"""
-        items = self.api_response_data.get("items", [])
-        self.assertGreater(len(items), 0)
+        self.assertGreater(len(self.items), 0)
 
-        for item in items:
+        for item in self.items:
             product_id = item.get("id", "")
             self.assertNotEqual(product_id, "")
             # Mercari 商品 ID 通常是字母數字組合
@@ -139,10 +94,9 @@ class TestMercariScraper(unittest.TestCase):
 
     def test_price_format(self):
         """測試價格格式（應該是字串，可轉換為整數）"""
-        items = self.api_response_data.get("items", [])
-        self.assertGreater(len(items), 0)
+        self.assertGreater(len(self.items), 0)
 
-        for item in items:
+        for item in self.items:
             price = item.get("price", "0")
             # 價格應該是字串格式
             self.assertIsInstance(price, str)
@@ -151,6 +105,39 @@ class TestMercariScraper(unittest.TestCase):
             self.assertGreaterEqual(price_int, 0)
 
 
+class TestMercariScraperParsing(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """共用一個 scraper（不讀取匯率資料庫）"""
+        with patch("src.scraper.ExchangeRate"):
+            cls.scraper = MercariScraper(headless=True, fetch_product_names=False)
+
+    def test_extract_product_id(self):
+        """測試從各種商品 URL 提取商品 ID"""
+        cases = [
+            ("products", "https://jp.mercari.com/products/m1234567890", "m1234567890"),
+            ("item", "https://jp.mercari.com/item/m9876543210", "m9876543210"),
+            ("jp", "https://item.mercari.com/jp/m5555555555", "m5555555555"),
+            ("invalid", "https://example.com/invalid", None),
+        ]
+        for case_id, url, expected in cases:
+            with self.subTest(case_id):
+                self.assertEqual(self.scraper._extract_product_id(url), expected)
+
+    def test_parse_price(self):
+        """測試解析各種價格文字格式"""
+        cases = [
+            ("jpy_and_twd", "29,737日圓 NT$6,296", (29737, 6296)),
+            ("twd_only", "NT$4,869", (0, 4869)),
+            ("yen_sign", "¥19,050 NT$4,023", (19050, 4023)),
+            ("bare_number", "4,869", (0, 4869)),
+            ("empty", "", (0, 0)),
+        ]
+        for case_id, price_text, expected in cases:
+            with self.subTest(case_id):
+                self.assertEqual(self.scraper._parse_price(price_text), expected)
+
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -4,23 +4,25 @@
 """
 
 import unittest
-import os
-import tempfile
-import shutil
 from src.storage import ProductStorage
 
 
 class TestProductStorage(unittest.TestCase):
-    def setUp(self):
-        """每個測試前創建臨時資料庫"""
-        self.temp_dir = tempfile.mkdtemp()
-        self.db_path = os.path.join(self.temp_dir, "test_products.db")
-        self.storage = ProductStorage(db_path=self.db_path)
+    @classmethod
+    def setUpClass(cls):
+        """整個測試類別共用一個記憶體資料庫"""
+        cls.storage = ProductStorage(db_path=":memory:")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.storage.close()
 
-    def tearDown(self):
-        """每個測試後清理臨時資料庫"""
-        if os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
+    def setUp(self):
+        """每個測試前清空資料表"""
+        conn = self.storage._connect()
+        conn.execute("DELETE FROM products")
+        conn.execute("DELETE FROM ignored_products")
+        conn.commit()
 
     def test_upsert_new_product(self):
         """測試新增商品"""
@@ -37,8 +39,9 @@ class TestProductStorage(unittest.TestCase):
         # 檢查商品是否已新增
         existing = self.storage.get_existing_products({"test123"})
         self.assertIn("test123", existing)
-        self.assertEqual(existing["test123"]["title"], "測試商品")
-        self.assertEqual(existing["test123"]["price_jpy"], 1000)
+        got = existing["test123"]
+        expected = {"title": "測試商品", "price_jpy": 1000}
+        self.assertEqual({k: got[k] for k in expected}, expected)
 
     def test_upsert_update_product(self):
         """測試更新商品"""
@@ -65,11 +68,63 @@ class TestProductStorage(unittest.TestCase):
         self.storage.upsert_product(product2)
 
         # 檢查商品是否已更新
-        existing = self.storage.get_existing_products({"test123"})
-        self.assertEqual(existing["test123"]["title"], "更新的商品")
-        self.assertEqual(existing["test123"]["price_jpy"], 900)
+        got = self.storage.get_existing_products({"test123"})["test123"]
         # 最低價格應該是 900（因為 900 < 1000）
-        self.assertEqual(existing["test123"]["lowest_price_jpy"], 900)
+        expected = {"title": "更新的商品", "price_jpy": 900, "lowest_price_jpy": 900}
+        self.assertEqual({k: got[k] for k in expected}, expected)
+
+    def test_upsert_products_batch(self):
+        """測試批次新增/更新商品（結果與逐筆 upsert 相同）"""
+        product1 = {
+            "id": "test123",
+            "title": "測試商品",
+            "price_jpy": 1000,
+            "price_twd": 200,
+            "image_url": "https://example.com/image.jpg",
+            "product_url": "https://example.com/product",
+        }
+        product2 = {**product1, "title": "更新的商品", "price_jpy": 900, "price_twd": 180}
+        product3 = {**product1, "id": "test456", "price_jpy": 0, "price_twd": 0}
+
+        self.storage.upsert_products([product1, product2, product3])
+
+        existing = self.storage.get_existing_products({"test123", "test456"})
+        got = existing["test123"]
+        expected = {"title": "更新的商品", "price_jpy": 900, "lowest_price_jpy": 900}
+        self.assertEqual({k: got[k] for k in expected}, expected)
+        self.assertIsNone(existing["test456"]["lowest_price_jpy"])
+
+    def test_upsert_products_lowest_price_rules(self):
+        """測試最低價格規則：漲價或 0 元不覆蓋最低價，0/1 的舊最低價會被取代"""
+        product = {
+            "id": "test123",
+            "title": "測試商品",
+            "price_jpy": 1,
+            "price_twd": 1,
+            "image_url": "https://example.com/image.jpg",
+            "product_url": "https://example.com/product",
+        }
+        self.storage.upsert_products([product])
+        first_seen = self.storage.get_existing_products({"test123"})["test123"][
+            "first_seen"
+        ]
+
+        self.storage.upsert_products(
+            [
+                {**product, "price_jpy": 1000, "price_twd": 200},
+                {**product, "price_jpy": 1500, "price_twd": 300},
+                {**product, "price_jpy": 0, "price_twd": 0},
+            ]
+        )
+
+        got = self.storage.get_existing_products({"test123"})["test123"]
+        expected = {
+            "price_jpy": 0,
+            "lowest_price_jpy": 1000,
+            "lowest_price_twd": 200,
+            "first_seen": first_seen,
+        }
+        self.assertEqual({k: got[k] for k in expected}, expected)
 
     def test_compare_products_new(self):
         """測試比較商品 - 新商品"""
@@ -100,7 +155,7 @@ class TestProductStorage(unittest.TestCase):
             "image_url": "https://example.com/image.jpg",
             "product_url": "https://example.com/product",
         }
-        self.storage.upsert_product(product1)
+        self.storage.upsert_products([product1])
 
         # 價格降低
         product2 = {
@@ -117,10 +172,11 @@ class TestProductStorage(unittest.TestCase):
 
         self.assertEqual(len(result["new"]), 0)
         self.assertEqual(len(result["price_dropped"]), 1)
-        self.assertEqual(result["price_dropped"][0]["old_price_jpy"], 1000)
-        # 驗證 old_price_twd 是否正確返回
-        self.assertIn("old_price_twd", result["price_dropped"][0])
-        self.assertEqual(result["price_dropped"][0]["old_price_twd"], 200)
+        # 驗證 old_price_jpy / old_price_twd 是否正確返回
+        self.assertEqual(
+            result["price_dropped"][0],
+            {"product": product2, "old_price_jpy": 1000, "old_price_twd": 200},
+        )
 
     def test_compare_products_no_price_drop(self):
         """測試比較商品 - 價格未降低（不應該觸發通知）"""
@@ -133,7 +189,7 @@ class TestProductStorage(unittest.TestCase):
             "image_url": "https://example.com/image.jpg",
             "product_url": "https://example.com/product",
         }
-        self.storage.upsert_product(product1)
+        self.storage.upsert_products([product1])
 
         # 價格相同或更高
         product2 = {
@@ -151,6 +207,38 @@ class TestProductStorage(unittest.TestCase):
         self.assertEqual(len(result["new"]), 0)
         self.assertEqual(len(result["price_dropped"]), 0)  # 價格提高，不應該觸發通知
 
+    def test_compare_products_mixed_batch(self):
+        """測試比較商品 - 一次比較新商品、降價與漲價，並在同一批寫入"""
+        base = {
+            "title": "測試商品",
+            "image_url": "https://example.com/image.jpg",
+            "product_url": "https://example.com/product",
+        }
+        self.storage.upsert_products(
+            [
+                {**base, "id": "drop", "price_jpy": 1000, "price_twd": 200},
+                {**base, "id": "rise", "price_jpy": 1000, "price_twd": 200},
+            ]
+        )
+
+        dropped = {**base, "id": "drop", "price_jpy": 800, "price_twd": 160}
+        risen = {**base, "id": "rise", "price_jpy": 1200, "price_twd": 240}
+        new = {**base, "id": "new", "price_jpy": 500, "price_twd": 100}
+        result = self.storage.compare_products([dropped, risen, new])
+
+        self.assertEqual(result["new"], [new])
+        self.assertEqual(
+            result["price_dropped"],
+            [{"product": dropped, "old_price_jpy": 1000, "old_price_twd": 200}],
+        )
+
+        # 所有商品都已寫入，最低價格依規則更新
+        stored = self.storage.get_existing_products({"drop", "rise", "new"})
+        self.assertEqual(
+            {pid: row["lowest_price_jpy"] for pid, row in stored.items()},
+            {"drop": 800, "rise": 1000, "new": 500},
+        )
+
     def test_add_ignored_and_get_ignored_ids(self):
         """測試加入忽略清單與取得忽略清單"""
         self.assertEqual(self.storage.get_ignored_ids(), set())
@@ -194,7 +282,7 @@ class TestProductStorage(unittest.TestCase):
             "image_url": "https://example.com/image.jpg",
             "product_url": "https://example.com/product",
         }
-        self.storage.upsert_product(product1)
+        self.storage.upsert_products([product1])
 
         product2 = {
             "id": "ignored_drop",
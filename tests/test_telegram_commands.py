@@ -7,38 +7,72 @@ import os
 import tempfile
 import shutil
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 
+from src import telegram_commands
 from src.storage import ProductStorage
 from src.telegram_commands import process_ignore_commands
 
 
-class TestProcessIgnoreCommands(unittest.TestCase):
-    def setUp(self):
-        self.temp_dir = tempfile.mkdtemp()
-        self.db_path = os.path.join(self.temp_dir, "test_products.db")
-        self.storage = ProductStorage(db_path=self.db_path)
+class _Resp:
+    """getUpdates 回應的輕量替身（只提供 json 與 raise_for_status）"""
+
+    def __init__(self, data):
+        self._data = data
 
-    def tearDown(self):
-        if os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
+    def json(self):
+        return self._data
 
-    @patch("src.telegram_commands.requests.get")
-    def test_process_ignore_commands_adds_to_storage(self, mock_get):
+    def raise_for_status(self):
+        pass
+
+
+class TestProcessIgnoreCommands(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """共用記憶體資料庫；offset 檔寫到臨時目錄，避免污染 data/"""
+        cls.storage = ProductStorage(db_path=":memory:")
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.offset_path = os.path.join(cls.temp_dir, "telegram_offset.txt")
+        cls.offset_patcher = patch.object(
+            telegram_commands, "OFFSET_FILE", cls.offset_path
+        )
+        cls.offset_patcher.start()
+        # getUpdates 的 HTTP 請求只 patch 一次，各測試只設定回應內容
+        cls.get_patcher = patch("src.telegram_commands.requests.get")
+        cls.mock_get = cls.get_patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.get_patcher.stop()
+        cls.offset_patcher.stop()
+        cls.storage.close()
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+
+    def setUp(self):
+        self.mock_get.reset_mock(return_value=True)
+        conn = self.storage._connect()
+        conn.execute("DELETE FROM ignored_products")
+        conn.commit()
+        if os.path.exists(self.offset_path):
+            os.remove(self.offset_path)
+
+    def test_process_ignore_commands_adds_to_storage(self):
         """測試處理 /ignore 指令會加入忽略清單"""
-        mock_get.return_value.json.return_value = {
-            "ok": True,
-            "result": [
-                {
-                    "update_id": 1,
-                    "message": {
-                        "chat": {"id": 12345},
-                        "text": "/ignore m12345678",
-                    },
-                }
-            ],
-        }
-        mock_get.return_value.raise_for_status = MagicMock()
+        self.mock_get.return_value = _Resp(
+            {
+                "ok": True,
+                "result": [
+                    {
+                        "update_id": 1,
+                        "message": {
+                            "chat": {"id": 12345},
+                            "text": "/ignore m12345678",
+                        },
+                    }
+                ],
+            }
+        )
 
         process_ignore_commands(
             self.storage,
@@ -48,22 +82,22 @@ class TestProcessIgnoreCommands(unittest.TestCase):
 
         self.assertEqual(self.storage.get_ignored_ids(), {"m12345678"})
 
-    @patch("src.telegram_commands.requests.get")
-    def test_process_ignore_commands_ignores_wrong_chat(self, mock_get):
+    def test_process_ignore_commands_ignores_wrong_chat(self):
         """測試只處理設定 chat 的訊息"""
-        mock_get.return_value.json.return_value = {
-            "ok": True,
-            "result": [
-                {
-                    "update_id": 1,
-                    "message": {
-                        "chat": {"id": 99999},
-                        "text": "/ignore m12345678",
-                    },
-                }
-            ],
-        }
-        mock_get.return_value.raise_for_status = MagicMock()
+        self.mock_get.return_value = _Resp(
+            {
+                "ok": True,
+                "result": [
+                    {
+                        "update_id": 1,
+                        "message": {
+                            "chat": {"id": 99999},
+                            "text": "/ignore m12345678",
+                        },
+                    }
+                ],
+            }
+        )
 
         process_ignore_commands(
             self.storage,
@@ -73,11 +107,9 @@ class TestProcessIgnoreCommands(unittest.TestCase):
 
         self.assertEqual(self.storage.get_ignored_ids(), set())
 
-    @patch("src.telegram_commands.requests.get")
-    def test_process_ignore_commands_empty_result(self, mock_get):
+    def test_process_ignore_commands_empty_result(self):
         """測試空結果不影響 storage"""
-        mock_get.return_value.json.return_value = {"ok": True, "result": []}
-        mock_get.return_value.raise_for_status = MagicMock()
+        self.mock_get.return_value = _Resp({"ok": True, "result": []})
 
         process_ignore_commands(
             self.storage,